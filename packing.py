@@ -0,0 +1,123 @@
+import mmap
+import os
+
+from solution import boxes, grid_values
+
+# Each box is stored as one hex nibble: 0 for an empty box, 1-9 for a digit.
+# 81 nibbles are padded to a whole number of bytes.
+RECORD_SIZE = (len(boxes) + 1) // 2
+
+_grid_chars = frozenset('.123456789')
+_nibble_chars = frozenset('0123456789')
+_to_nibbles = str.maketrans('.', '0')
+
+
+def encode_grid(grid):
+    """Pack a sudoku into a fixed-width binary record.
+        Args:
+            grid: a grid in string form, or a values dictionary whose boxes are either solved
+                or empty ('123456789').
+        Returns:
+            RECORD_SIZE bytes, 4 bits per box.
+    """
+    if isinstance(grid, dict):
+        assert all(len(grid[box]) == 1 or grid[box] == '123456789' for box in boxes), \
+            "Every box must be either solved or empty ('123456789')"
+        grid = ''.join(grid[box] if len(grid[box]) == 1 else '.' for box in boxes)
+    assert len(grid) == 81, "Input grid must be a string of length 81 (9x9)"
+    assert set(grid) <= _grid_chars, "Input grid may only contain the characters '.123456789'"
+    return bytes.fromhex(grid.translate(_to_nibbles) + '0' * (2 * RECORD_SIZE - len(grid)))
+
+
+def decode_string(data):
+    """Unpack a binary record into a grid in string form, with '.' for empty boxes."""
+    assert len(data) == RECORD_SIZE, "Record must be %d bytes long" % RECORD_SIZE
+    nibbles = bytes(data).hex()[:81]
+    assert set(nibbles) <= _nibble_chars, "Record may only contain the nibbles 0-9"
+    return nibbles.replace('0', '.')
+
+
+def decode_grid(data):
+    """Unpack a binary record into a grid in dictionary form, as returned by grid_values."""
+    return grid_values(decode_string(data))
+
+
+def write_packed(path, grids):
+    """Write grids (strings or values dictionaries) to a file of packed records.
+        Returns:
+            The number of grids written.
+    """
+    count = 0
+    with open(path, 'wb') as f:
+        for grid in grids:
+            f.write(encode_grid(grid))
+            count += 1
+    return count
+
+
+class PackedGrids(object):
+    """Read-only, memory-mapped view over a file of packed grid records.
+
+        Indexing with an integer returns the grid in string form. Slicing returns a memoryview
+        over the raw records without copying them, so batches can be handed straight to a solver.
+    """
+
+    def __init__(self, path):
+        size = os.path.getsize(path)
+        assert size % RECORD_SIZE == 0, "File size must be a multiple of %d bytes" % RECORD_SIZE
+        self._file = open(path, 'rb')
+        self._count = size // RECORD_SIZE
+        # mmap refuses zero-length files, so an empty store gets an empty buffer instead
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def _buffer(self):
+        """A fresh view over the whole file. Only the slices taken from it outlive the call."""
+        return memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            assert step == 1, "Slices of packed grids must be contiguous"
+            return self._buffer()[start * RECORD_SIZE:max(start, stop) * RECORD_SIZE]
+        return decode_string(self.record(index))
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def record(self, index):
+        """Return the raw packed record at index as a memoryview."""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('packed grid index out of range')
+        return self._buffer()[index * RECORD_SIZE:(index + 1) * RECORD_SIZE]
+
+    def values(self, index):
+        """Return the grid at index in dictionary form."""
+        return decode_grid(self.record(index))
+
+    def close(self):
+        """Unmap the file and close it.
+
+            Slices handed out earlier must be released first. Otherwise BufferError is raised
+            and the grids stay open and usable.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(view):
+    """Split a slice of PackedGrids into its individual records."""
+    for offset in range(0, len(view), RECORD_SIZE):
+        yield view[offset:offset + RECORD_SIZE]
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+import packing
+import solution
+
+
+class TestPacking(unittest.TestCase):
+    diagonal_grid = '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        data = packing.encode_grid(self.diagonal_grid)
+        self.assertEqual(len(data), packing.RECORD_SIZE)
+        self.assertEqual(packing.decode_string(data), self.diagonal_grid)
+        self.assertEqual(packing.decode_grid(data), solution.grid_values(self.diagonal_grid))
+
+    def test_encode_values(self):
+        values = solution.grid_values(self.diagonal_grid)
+        self.assertEqual(packing.encode_grid(values), packing.encode_grid(self.diagonal_grid))
+
+    def test_packed_grids(self):
+        solved = solution.solve(self.diagonal_grid)
+        self.assertEqual(packing.write_packed(self.path, [self.diagonal_grid, solved]), 2)
+        with packing.PackedGrids(self.path) as grids:
+            self.assertEqual(len(grids), 2)
+            self.assertEqual(grids[0], self.diagonal_grid)
+            self.assertEqual(grids.values(-1), solved)
+            batch = grids[1:]
+            self.assertEqual(len(batch), packing.RECORD_SIZE)
+            self.assertEqual([packing.decode_grid(r) for r in packing.iter_records(batch)], [solved])
+            batch.release()
+            with self.assertRaises(IndexError):
+                grids.record(2)
+
+    def test_encode_invalid(self):
+        with self.assertRaises(AssertionError):
+            packing.encode_grid('a' + self.diagonal_grid[1:])
+        with self.assertRaises(AssertionError):
+            packing.encode_grid('0' + self.diagonal_grid[1:])
+        values = solution.grid_values(self.diagonal_grid)
+        values['A2'] = '23'
+        with self.assertRaises(AssertionError):
+            packing.encode_grid(values)
+
+    def test_decode_invalid(self):
+        with self.assertRaises(AssertionError):
+            packing.decode_string(b'\xff' * packing.RECORD_SIZE)
+        with open(self.path, 'wb') as f:
+            f.write(b'\xff' * packing.RECORD_SIZE)
+        with packing.PackedGrids(self.path) as grids:
+            with self.assertRaises(AssertionError):
+                grids[0]
+
+    def test_bad_file_size(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\x00' * (packing.RECORD_SIZE + 1))
+        with self.assertRaises(AssertionError):
+            packing.PackedGrids(self.path)
+
+    def test_close_with_open_slice(self):
+        packing.write_packed(self.path, [self.diagonal_grid])
+        grids = packing.PackedGrids(self.path)
+        batch = grids[:]
+        with self.assertRaises(BufferError):
+            grids.close()
+        self.assertEqual(grids[0], self.diagonal_grid)
+        batch.release()
+        grids.close()
+
+    def test_empty_file(self):
+        packing.write_packed(self.path, [])
+        with packing.PackedGrids(self.path) as grids:
+            self.assertEqual(len(grids), 0)
+            self.assertEqual(list(grids), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
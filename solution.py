@@ -1,5 +1,16 @@
+from collections import namedtuple
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+
 from profilers import *
 
+try:
+    import numpy as np
+except ImportError:
+    # validate_many falls back to a pure Python column-wise check
+    np = None
+
 assignments = []
 
 
@@ -14,6 +25,34 @@ def assign_value(values, box, value):
     return values
 
 
+class Deduction(namedtuple('Deduction', ['strategy', 'box', 'digits', 'cause'])):
+    """A single step taken while solving: strategy removed digits from box because of the cause boxes.
+
+        The 'search' strategy records a guess, removing every other digit from the box. A
+        'backtrack' step removes nothing: it records that the guess of digits in box led to a
+        contradiction, and restores the board to how it was before that guess.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        if self.strategy == 'backtrack':
+            return 'backtrack: guessing %s for %s failed, restoring the board from before that guess' % (
+                self.digits, self.box)
+        text = '%s removed %s from %s' % (self.strategy, self.digits, self.box)
+        if self.cause:
+            text += ' because of (%s)' % ', '.join(self.cause)
+        return text
+
+
+def exhaust(steps):
+    """Run a step generator to completion, discarding its deductions, and return its result."""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
 def cross(A, B):
     """Cross product of elements in A and elements in B."""
     return [s + t for s in A for t in B]
@@ -35,6 +74,8 @@ unitlist = row_units + column_units + square_units + diagonal_units
 
 units = dict((s, [u for u in unitlist if s in u]) for s in boxes)
 peers = dict((s, set(sum(units[s], [])) - set([s])) for s in boxes)
+# Fetch the candidates of every box in a unit from a values dictionary in one call
+unit_candidates = [itemgetter(*unit) for unit in unitlist]
 
 
 def grid_values(grid):
@@ -53,6 +94,131 @@ def grid_values(grid):
     return filled
 
 
+def grid_string(values):
+    """
+    Convert a grid in dictionary form back into string form.
+    Args:
+        values(dict): The sudoku in dictionary form. A string grid is returned unchanged.
+    Returns:
+        A string of length 81 with '.' for every box that is missing or not yet solved.
+        Anything that is neither a string nor a dictionary gives an empty string.
+    """
+    if isinstance(values, str):
+        return values
+    if not isinstance(values, dict):
+        return ''
+    grid = []
+    for box in boxes:
+        value = values.get(box, '')
+        grid.append(value if isinstance(value, str) and len(value) == 1 else '.')
+    return ''.join(grid)
+
+
+# Positions of each unit's boxes within a grid string, used to check whole units at once
+unit_getters = [itemgetter(*[boxes.index(box) for box in unit]) for unit in unitlist]
+all_digits = frozenset(cols)
+clue_chars = frozenset('.' + cols)
+
+
+def puzzle_string(puzzle):
+    """
+    Convert a puzzle into string form, checking that it is a well formed grid.
+    Args:
+        puzzle: the puzzle in dictionary or string form.
+    Returns:
+        A string of length 81 with '.' for every empty box.
+    """
+    clues = grid_string(puzzle)
+    assert len(clues) == 81, "Puzzle must be a grid of length 81 (9x9)"
+    assert set(clues) <= clue_chars, "Puzzle may only contain the characters '.123456789'"
+    return clues
+
+
+def validate(values, puzzle=None):
+    """Check that a finished sudoku is a valid solution.
+        Args:
+            values: the solved sudoku, in dictionary or string form.
+            puzzle: optionally, the original puzzle in dictionary or string form. Its clues must
+                be kept by the solution.
+        Returns:
+            True if every unit, including the diagonals, holds exactly the digits 1-9 and the
+            clues agree, False otherwise.
+    """
+    clues = None if puzzle is None else puzzle_string(puzzle)
+    grid = grid_string(values)
+    if len(grid) != 81:
+        return False
+    for getter in unit_getters:
+        if frozenset(getter(grid)) != all_digits:
+            return False
+    if clues is not None:
+        for clue, value in zip(clues, grid):
+            if clue != '.' and clue != value:
+                return False
+    return True
+
+
+def validate_many(grids, puzzles=None, batch_size=4096):
+    """Validate a batch of finished sudokus.
+
+        With numpy installed, grids are checked in chunks of batch_size, each as a single
+        array. Without it, every grid is checked with validate, which is no faster than
+        calling validate in a loop.
+
+        Args:
+            grids: an iterable of solved sudokus, in dictionary or string form.
+            puzzles: optionally, an iterable of the matching original puzzles, one per grid.
+            batch_size: the number of grids checked together.
+        Returns:
+            A list with one boolean per grid, as returned by validate.
+    """
+    grids = iter(grids)
+    puzzles = None if puzzles is None else iter(puzzles)
+    results = []
+    while True:
+        batch = [grid_string(values) for values in islice(grids, batch_size)]
+        clues = None
+        if puzzles is not None:
+            clues = [puzzle_string(puzzle) for puzzle in islice(puzzles, batch_size)]
+            assert len(clues) == len(batch), "There must be exactly one puzzle per grid"
+        if not batch:
+            return results
+        if np is not None:
+            results.extend(_validate_array(batch, clues))
+        elif clues is None:
+            results.extend(validate(grid) for grid in batch)
+        else:
+            results.extend(validate(grid, clue) for grid, clue in zip(batch, clues))
+
+
+def _validate_array(batch, clues):
+    """numpy version of validate_many for a non-empty list of grid strings and their puzzles."""
+    valid = np.array([len(grid) == 81 for grid in batch])
+    # Grids of the wrong length are already invalid; pad them so every row of the array lines up
+    grid = _char_array([grid if len(grid) == 81 else '.' * 81 for grid in batch])
+    # A unit is complete when OR-ing the bits of its nine digits sets all nine bits
+    bits = _digit_bits[grid]
+    complete = np.bitwise_or.reduce(bits[:, _unit_positions], axis=2) == 0x1ff
+    valid &= complete.all(axis=1)
+    if clues is not None:
+        clue = _char_array(clues)
+        valid &= ((clue == ord('.')) | (clue == grid)).all(axis=1)
+    return valid.tolist()
+
+
+def _char_array(grids):
+    """Convert a list of 81 character strings to an (n, 81) array of byte values."""
+    data = ''.join(grids).encode('ascii', 'replace')
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(grids), 81)
+
+
+if np is not None:
+    _unit_positions = np.array([[boxes.index(box) for box in unit] for unit in unitlist])
+    _digit_bits = np.zeros(256, dtype=np.uint16)
+    for _digit in cols:
+        _digit_bits[ord(_digit)] = 1 << (int(_digit) - 1)
+
+
 def display(values):
     """
     Display the values as a 2-D grid.
@@ -68,6 +234,108 @@ def display(values):
     return
 
 
+class CandidateMasks(dict):
+    """Dict from a box's candidates to their mask, filling in orderings such as '98' on first use."""
+
+    def __missing__(self, cell):
+        mask = 0
+        for digit in cell:
+            mask |= 1 << (int(digit) - 1)
+        self[cell] = mask
+        return mask
+
+
+@lru_cache(maxsize=None)
+def mask_tables():
+    """Build the lookup tables shared by the unit strategies, the first time they are needed.
+
+        A set of candidates is kept as a 9-bit mask, with bit i set for digit i + 1. The
+        tables start with the 512 possible masks, one candidate string in ascending order each.
+
+        Returns:
+            candidate_masks: CandidateMasks from a box's candidates, e.g. '237', to their mask.
+            mask_bits: list giving the set bits of every mask, e.g. (1, 2, 6) for '237'.
+    """
+    mask_bits = [tuple(bit for bit in range(9) if mask & (1 << bit)) for mask in range(512)]
+    candidate_masks = CandidateMasks((''.join(cols[bit] for bit in bits), mask) for mask, bits in enumerate(mask_bits))
+    return candidate_masks, mask_bits
+
+
+def hidden_singles(cells):
+    """Find the unsolved digits of a unit that fit in a single box.
+        Args:
+            cells(tuple): the candidates of the nine boxes in a unit, in unit order.
+        Returns:
+            a list of (position, digit) for every hidden single.
+    """
+    candidate_masks, mask_bits = mask_tables()
+    # Track the digits seen at least once and at least twice across the unit
+    once = twice = solved = 0
+    for cell in cells:
+        mask = candidate_masks[cell]
+        twice |= once & mask
+        once |= mask
+        if len(cell) == 1:
+            solved |= mask
+    singles = []
+    for bit in mask_bits[once & ~twice & ~solved]:
+        digit = cols[bit]
+        for position, cell in enumerate(cells):
+            if digit in cell:
+                singles.append((position, digit))
+                break
+    return singles
+
+
+def naked_pairs(cells):
+    """Find the boxes of a unit that share the same two values.
+
+        This is a single dict scan over the candidate strings and needs no mask tables.
+        Like naked_twins always has, it only pairs boxes whose values are equal strings.
+
+        Args:
+            cells(tuple): the candidates of the nine boxes in a unit, in unit order.
+        Returns:
+            a list of (position, twin position), counting only the first twin of each value.
+    """
+    pairs = []
+    first_seen = {}
+    for position, cell in enumerate(cells):
+        if len(cell) == 2:
+            if cell not in first_seen:
+                first_seen[cell] = position
+            elif first_seen[cell] is not None:
+                pairs.append((first_seen[cell], position))
+                first_seen[cell] = None
+    return pairs
+
+
+def hidden_pairs(cells):
+    """Find two digits of a unit that are confined to the same two boxes.
+        Args:
+            cells(tuple): the candidates of the nine boxes in a unit, in unit order.
+        Returns:
+            a list of ((position, position), digits) for every pair whose boxes still hold other values.
+    """
+    candidate_masks, mask_bits = mask_tables()
+    # The mask of positions each digit can go in
+    places = [0] * 9
+    for position, cell in enumerate(cells):
+        for bit in mask_bits[candidate_masks[cell]]:
+            places[bit] |= 1 << position
+    pair_digits = {}
+    for bit, place in enumerate(places):
+        if len(mask_bits[place]) == 2:
+            pair_digits[place] = pair_digits.get(place, '') + cols[bit]
+    pairs = []
+    for place, digits in pair_digits.items():
+        positions = mask_bits[place]
+        # Both boxes hold the two digits, so any longer box still holds other values
+        if len(digits) == 2 and (len(cells[positions[0]]) > 2 or len(cells[positions[1]]) > 2):
+            pairs.append((positions, digits))
+    return pairs
+
+
 def eliminate(values):
     """Eliminate values from peers of each box with a single value.
 
@@ -79,10 +347,17 @@ def eliminate(values):
         Returns:
             Resulting Sudoku in dictionary form after eliminating values.
     """
+    return exhaust(eliminate_steps(values))
+
+
+def eliminate_steps(values):
+    """Step-wise version of eliminate, yielding a Deduction for every value removed from a peer."""
     for box, value in values.items():
         if len(value) == 1:
             for p in peers[box]:
-                assign_value(values, p, values[p].replace(value, ""))
+                if value in values[p]:
+                    assign_value(values, p, values[p].replace(value, ""))
+                    yield Deduction('eliminate', p, value, (box,))
 
     return values
 
@@ -98,11 +373,21 @@ def only_choice(values):
         Returns:
             Resulting Sudoku in dictionary form after filling in only choices.
     """
-    for unit in unitlist:
-        for digit in '123456789':
-            dplaces = [box for box in unit if digit in values[box]]
-            if len(dplaces) == 1:
-                assign_value(values, dplaces[0], digit)
+    return exhaust(only_choice_steps(values))
+
+
+def only_choice_steps(values):
+    """Step-wise version of only_choice, yielding a Deduction for every box it fills in.
+        The cause of each deduction is the rest of the unit, none of which can hold the digit.
+    """
+    for unit, candidates in zip(unitlist, unit_candidates):
+        for position, digit in hidden_singles(candidates(values)):
+            box = unit[position]
+            # An earlier digit may already have claimed this box
+            if digit in values[box]:
+                removed = values[box].replace(digit, "")
+                assign_value(values, box, digit)
+                yield Deduction('only_choice', box, removed, tuple(b for b in unit if b != box))
     return values
 
 
@@ -114,48 +399,68 @@ def naked_twins(values):
         Returns:
             the values dictionary with the naked twins eliminated from peers.
     """
+    return exhaust(naked_twins_steps(values))
 
-    def find_twin(unit, box):
-        """Given a unit and a box with two values, try to find a twin box.
-            Args:
-                unit(array): an array containing the boxes for a single unit.
-                box(string): a box with two values.
 
-            Returns:
-                a twin box if one is found, False if no twin is found.
-        """
-        assert len(values[box]) == 2, "box must only have two values"
-        for twin_box in unit:
-            if twin_box != box and values[twin_box] == values[box]:
-                return twin_box
-        return False
+def naked_twins_steps(values):
+    """Step-wise version of naked_twins, yielding a Deduction for every value removed from a peer."""
 
-    def reduce_peers(unit, twin_box):
+    def reduce_peers(unit, box, twin_box):
         """Given a unit and a box with a twin, remove the twin values from the remaining unit.
             Args:
                 unit(array): an array containing the boxes for a single unit.
-                twin_box(string): a box with two values that has a twin.
+                box(string): a box with two values.
+                twin_box(string): the twin of box.
         """
         assert len(values[twin_box]) == 2, "twin_box must only have two values"
         twin_values = values[twin_box]
-        for box in unit:
+        for peer in unit:
             for value in twin_values:
-                if value in values[box] and values[box] != twin_values:
-                    assign_value(values, box, values[box].replace(value, ""))
+                if value in values[peer] and values[peer] != twin_values:
+                    assign_value(values, peer, values[peer].replace(value, ""))
+                    yield Deduction('naked_twins', peer, value, (box, twin_box))
 
         pass
 
     # Find all instances of naked twins
     # Eliminate the naked twins as possibilities for their unit peers
-    for unit in unitlist:
-        # Keep track of the discovered twins so we don't repeat ourselves
-        naked_twins_discovered = []
-        for box in unit:
-            if box not in naked_twins_discovered and len(values[box]) == 2:
-                twin_box = find_twin(unit, box)
-                if twin_box:
-                    naked_twins_discovered.extend([box, twin_box])
-                    reduce_peers(unit, twin_box)
+    for unit, candidates in zip(unitlist, unit_candidates):
+        for position, twin_position in naked_pairs(candidates(values)):
+            box, twin_box = unit[position], unit[twin_position]
+            # Reducing an earlier pair in this unit may have broken this one
+            if len(values[box]) == 2 and values[twin_box] == values[box]:
+                yield from reduce_peers(unit, box, twin_box)
+
+    return values
+
+
+def hidden_twins(values):
+    """Eliminate values using the hidden twins strategy.
+
+        Whenever two digits of a unit only fit in the same two boxes, those boxes
+        can't hold any other values. It is not part of reduce_puzzle, so it never
+        changes which solution solve finds.
+
+        Args:
+            values(dict): a dictionary of the form {'box_name': '123456789', ...}
+
+        Returns:
+            the values dictionary with the other values removed from the hidden twins.
+    """
+    return exhaust(hidden_twins_steps(values))
+
+
+def hidden_twins_steps(values):
+    """Step-wise version of hidden_twins, yielding a Deduction for every box it narrows down."""
+    for unit, candidates in zip(unitlist, unit_candidates):
+        for positions, digits in hidden_pairs(candidates(values)):
+            twins = tuple(unit[position] for position in positions)
+            for box in twins:
+                # Skip boxes an earlier pair in this unit has already narrowed down
+                if len(values[box]) > 2 and all(digit in values[box] for digit in digits):
+                    removed = ''.join(value for value in values[box] if value not in digits)
+                    assign_value(values, box, digits)
+                    yield Deduction('hidden_twins', box, removed, twins)
 
     return values
 
@@ -168,6 +473,11 @@ def naked_chain(values):
         Returns:
             the values dictionary with the naked chain eliminated from peers.
     """
+    return exhaust(naked_chain_steps(values))
+
+
+def naked_chain_steps(values):
+    """Step-wise version of naked_chain, yielding a Deduction for every value removed from a peer."""
     def find_chain(unit, first_box):
         """Given a unit and a box with two values, try to find a chain of boxes.
             Args:
@@ -268,6 +578,7 @@ def naked_chain(values):
                 for value in chain_values:
                     if value in values[box]:
                         assign_value(values, box, values[box].replace(value, ""))
+                        yield Deduction('naked_chain', box, value, tuple(chain))
 
         pass
 
@@ -278,25 +589,30 @@ def naked_chain(values):
             if len(values[box]) == 2:
                 chain = find_chain(unit, box)
                 if chain:
-                    reduce_peers(unit, chain)
+                    yield from reduce_peers(unit, chain)
 
     return values
 
 
 def reduce_puzzle(values):
+    return exhaust(reduce_puzzle_steps(values))
+
+
+def reduce_puzzle_steps(values):
+    """Step-wise version of reduce_puzzle, yielding the deductions of every strategy it applies."""
     stalled = False
     while not stalled:
         # Check how many boxes have a determined value
         solved_values_before = len([box for box in values.keys() if len(values[box]) == 1])
 
-        values = eliminate(values)
+        values = yield from eliminate_steps(values)
 
-        values = only_choice(values)
+        values = yield from only_choice_steps(values)
 
         # This strategy can reduce the total iterations required, but is generally so expensive that no time is saved
-        values = naked_chain(values)
+        values = yield from naked_chain_steps(values)
 
-        values = naked_twins(values)
+        values = yield from naked_twins_steps(values)
 
         # Check how many boxes have a determined value, to compare
         solved_values_after = len([box for box in values.keys() if len(values[box]) == 1])
@@ -310,8 +626,13 @@ def reduce_puzzle(values):
 
 def search(values):
     """Using depth-first search and propagation, create a search tree and solve the sudoku."""
+    return exhaust(search_steps(values))
+
+
+def search_steps(values):
+    """Step-wise version of search, yielding every deduction, guess and backtrack as it happens."""
     # First, reduce the puzzle using the previous function
-    values = reduce_puzzle(values)
+    values = yield from reduce_puzzle_steps(values)
 
     if values is False:
         return False
@@ -338,14 +659,16 @@ def search(values):
     originalValues = values[nextBox]
     for value in originalValues:
         assign_value(values, nextBox, value)
-        result = search(values.copy())
+        yield Deduction('search', nextBox, originalValues.replace(value, ""), ())
+        result = yield from search_steps(values.copy())
         if (result):
             return result
+        yield Deduction('backtrack', nextBox, value, ())
 
     return False
 
 
-@do_profile(follow=[reduce_puzzle, naked_chain, naked_twins, only_choice, eliminate])
+@do_profile(follow=[reduce_puzzle_steps, naked_chain_steps, naked_twins_steps, only_choice_steps, eliminate_steps])
 def solve(grid):
     """Find the solution to a Sudoku grid.
         Args:
@@ -358,6 +681,23 @@ def solve(grid):
     return search(values)
 
 
+def solve_steps(grid):
+    """Solve a Sudoku grid one deduction at a time.
+
+        Nothing is solved ahead of the caller, so iteration can stop at any point, e.g. after
+        the first deduction to give a hint.
+
+        Args:
+            grid(string): a string representing a sudoku grid.
+        Yields:
+            A Deduction for every step taken. After a 'backtrack' step, the steps since the
+            matching 'search' guess no longer apply.
+        Returns:
+            The final sudoku grid, or False, as the generator's return value (StopIteration.value).
+    """
+    return search_steps(grid_values(grid))
+
+
 if __name__ == '__main__':
     diag_sudoku_grid = '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
     easy_grid = '..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3..'
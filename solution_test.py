@@ -1,5 +1,6 @@
 import solution
 import unittest
+from unittest import mock
 
 
 class TestNakedTwins(unittest.TestCase):
@@ -94,5 +95,139 @@ class TestDiagonalSudoku(unittest.TestCase):
     def test_solve(self):
         self.assertEqual(solution.solve(self.diagonal_grid), self.solved_diag_sudoku)
 
+
+class TestValidate(unittest.TestCase):
+    diagonal_grid = '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+    solved_grid = '267945381853716249491823576576438192384192657129657438642379815935281764718564923'
+
+    def test_validate(self):
+        self.assertTrue(solution.validate(self.solved_grid, self.diagonal_grid))
+        self.assertTrue(solution.validate(solution.solve(self.diagonal_grid), solution.grid_values(self.diagonal_grid)))
+
+    def test_validate_invalid(self):
+        swapped = self.solved_grid[1] + self.solved_grid[0] + self.solved_grid[2:]
+        self.assertFalse(solution.validate(swapped))
+        self.assertFalse(solution.validate(self.solved_grid[:80]))
+        self.assertFalse(solution.validate(solution.grid_values(self.diagonal_grid)))
+        self.assertFalse(solution.validate(self.solved_grid, '9' + self.diagonal_grid[1:]))
+        with self.assertRaises(AssertionError):
+            solution.validate(self.solved_grid, self.diagonal_grid[:40])
+
+    def test_validate_malformed_dict(self):
+        values = solution.grid_values(self.solved_grid)
+        del values['A1']
+        self.assertFalse(solution.validate(values))
+        values = solution.grid_values(self.solved_grid)
+        values['A1'] = 2
+        self.assertFalse(solution.validate(values))
+        self.assertFalse(solution.validate(None))
+
+    def check_validate_many(self):
+        swapped = self.solved_grid[1] + self.solved_grid[0] + self.solved_grid[2:]
+        grids = [self.solved_grid, swapped, self.solved_grid[:80], self.solved_grid]
+        puzzles = [self.diagonal_grid, self.diagonal_grid, self.diagonal_grid, '9' + self.diagonal_grid[1:]]
+        self.assertEqual(solution.validate_many(grids), [True, False, False, True])
+        self.assertEqual(solution.validate_many(grids, puzzles), [True, False, False, False])
+        self.assertEqual(solution.validate_many(iter(grids), batch_size=3), [True, False, False, True])
+        self.assertEqual(solution.validate_many(iter(grids), iter(puzzles), batch_size=3), [True, False, False, False])
+        self.assertEqual(solution.validate_many([]), [])
+        missing = solution.grid_values(self.solved_grid)
+        del missing['A1']
+        self.assertEqual(solution.validate_many([missing, None, self.solved_grid]), [False, False, True])
+        with self.assertRaises(AssertionError):
+            solution.validate_many(grids, puzzles[:1])
+        with self.assertRaises(AssertionError):
+            solution.validate_many(grids[:1], puzzles)
+        with self.assertRaises(AssertionError):
+            solution.validate_many(grids, [self.diagonal_grid[:40]] * len(grids))
+
+    def test_validate_many(self):
+        with mock.patch.object(solution, 'np', None):
+            self.check_validate_many()
+
+    @unittest.skipIf(solution.np is None, "numpy is not installed")
+    def test_validate_many_numpy(self):
+        self.check_validate_many()
+
+
+class TestSolveSteps(unittest.TestCase):
+    diagonal_grid = '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+    search_grid = '.679.........1.............576..........9.......6.....6.2......9...8.7.....5.4..3'
+
+    def test_first_step(self):
+        step = next(solution.solve_steps(self.diagonal_grid))
+        self.assertEqual(step.strategy, 'eliminate')
+        self.assertEqual(step.digits, '2')
+        self.assertEqual(step.cause, ('A1',))
+        self.assertEqual(str(step), 'eliminate removed 2 from %s because of (A1)' % step.box)
+
+    def test_result(self):
+        steps = solution.solve_steps(self.diagonal_grid)
+        self.assertEqual(solution.exhaust(steps), solution.solve(self.diagonal_grid))
+
+    def replay(self, grid):
+        """Apply every step of solve_steps to a fresh board, undoing guesses on backtrack."""
+        values = solution.grid_values(grid)
+        guesses = []
+        for step in solution.solve_steps(grid):
+            if step.strategy == 'backtrack':
+                box, values = guesses.pop()
+                self.assertEqual(box, step.box)
+                continue
+            if step.strategy == 'search':
+                guesses.append((step.box, values.copy()))
+            for digit in step.digits:
+                self.assertIn(digit, values[step.box])
+                values[step.box] = values[step.box].replace(digit, '')
+        return values
+
+    def test_replay(self):
+        self.assertEqual(self.replay(self.diagonal_grid), solution.solve(self.diagonal_grid))
+
+    def test_replay_search(self):
+        strategies = [step.strategy for step in solution.solve_steps(self.search_grid)]
+        self.assertIn('search', strategies)
+        self.assertIn('backtrack', strategies)
+        self.assertEqual(self.replay(self.search_grid), solution.solve(self.search_grid))
+
+    def test_backtrack_str(self):
+        step = solution.Deduction('backtrack', 'A6', '5', ())
+        self.assertEqual(str(step), 'backtrack: guessing 5 for A6 failed, restoring the board from before that guess')
+
+
+class TestUnitStrategies(unittest.TestCase):
+    cells = ('1', '23', '23', '4567', '4589', '4567', '4567', '4567', '456789')
+
+    def test_hidden_singles(self):
+        self.assertEqual(solution.hidden_singles(self.cells), [])
+        self.assertEqual(solution.hidden_singles(('1', '23', '23', '45', '45', '67', '67', '68', '9')), [(7, '8')])
+
+    def test_unsorted_candidates(self):
+        cells = ('1', '32', '23', '54', '45', '76', '67', '86', '9')
+        self.assertEqual(solution.hidden_singles(cells), [(7, '8')])
+        self.assertEqual(solution.hidden_pairs(('1', '32', '32', '7654', '98', '7654', '7654', '7654', '98765')),
+                         [((4, 8), '89')])
+        values = solution.grid_values('.' * 81)
+        values['A1'] = '98'
+        for box in solution.row_units[0][1:]:
+            values[box] = '1234569'
+        self.assertEqual(solution.only_choice(values)['A1'], '8')
+
+    def test_naked_pairs(self):
+        self.assertEqual(solution.naked_pairs(self.cells), [(1, 2)])
+
+    def test_hidden_pairs(self):
+        self.assertEqual(solution.hidden_pairs(self.cells), [((4, 8), '89')])
+
+    def test_hidden_twins(self):
+        values = solution.grid_values('.' * 81)
+        for box in solution.row_units[0][2:]:
+            values[box] = '3456789'
+        values = solution.hidden_twins(values)
+        self.assertEqual(values['A1'], '12')
+        self.assertEqual(values['A2'], '12')
+        self.assertEqual(values['B1'], '123456789')
+
+
 if __name__ == '__main__':
     unittest.main()